@@ -53,7 +53,7 @@ sudo -u ${DEVICE_USER} ${PYTHON_BIN} -m venv "${VENV_PATH}"
 echo "📦 Installing Python packages..."
 source "${VENV_PATH}/bin/activate"
 pip install --upgrade pip
-pip install requests speedtest-cli numpy
+pip install requests speedtest-cli numpy orjson icmplib
 deactivate
 
 # -------- CREATE ENVIRONMENT FILE --------
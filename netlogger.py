@@ -9,8 +9,36 @@ All configuration is read from environment variables.
 """
 
 import os, sys, time, csv, json, socket, statistics, signal, uuid, random, traceback, requests
+import atexit, queue, re, subprocess, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 
+# Fast JSON: orjson if available (parses ~2x, serializes ~10x faster and
+# returns bytes directly), otherwise fall back to stdlib json.
+try:
+    import orjson
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:
+    _json_dumps = lambda o: json.dumps(o).encode()
+    _json_loads = json.loads
+
+def _atomic_write(path, blob):
+    # Unique temp name per writer — concurrent savers must not truncate
+    # each other's temp file before os.replace lands.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                               prefix=os.path.basename(path) + ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
 # ========= CONFIGURATION (read from environment) =========
 
 DEVICE_ID         = os.getenv("NETLOGGER_DEVICE_ID", "NET-PI-xx")
@@ -30,9 +58,28 @@ SUPABASE_TABLE    = os.getenv("SUPABASE_TABLE", "netlogs")
 
 os.makedirs(LOG_DIR, exist_ok=True)
 
+# ========= SHARED HTTP SESSION =========
+# One pooled session for ipinfo, http-load probes and Supabase pushes —
+# keep-alive saves a TCP+TLS handshake (~2 RTTs) on every repeat call.
+_SESSION = requests.Session()
+_adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0)
+_SESSION.mount("https://", _adapter)
+_SESSION.mount("http://", _adapter)
+_SESSION.headers.update({"User-Agent": "netlogger/1.0"})
+
 # ========= SAFE SPEEDTEST CONSTRUCTOR =========
+# speedtest is slow to import, so keep it lazy — but import it once and
+# reuse the module instead of re-importing inside every hot function.
+_speedtest_mod = None
+def _speedtest():
+    global _speedtest_mod
+    if _speedtest_mod is None:
+        import speedtest
+        _speedtest_mod = speedtest
+    return _speedtest_mod
+
 def safe_speedtest(timeout=120):
-    import speedtest
+    speedtest = _speedtest()
     for attempt in range(3):
         try:
             st = speedtest.Speedtest(timeout=timeout)
@@ -49,20 +96,51 @@ def safe_speedtest(timeout=120):
     raise RuntimeError("Speedtest configuration failed after 3 retries.")
 
 # ========= GEO/IP =========
-_GEO_CACHE = {"ts": 0.0, "data": None}
+GEO_CACHE_FILE = os.getenv("NETLOGGER_IPINFO_CACHE", "/tmp/ipinfo_cache.json")
+_GEO_TTL_BASE  = 1800
+_GEO_TTL_MAX   = 4 * 3600
+
+def _load_geo_cache():
+    try:
+        with open(GEO_CACHE_FILE, "rb") as f:
+            c = _json_loads(f.read())
+        if c.get("data"):
+            return {"ts": float(c.get("ts", 0)), "data": c["data"],
+                    "ttl": float(c.get("ttl", _GEO_TTL_BASE))}
+    except Exception:
+        pass
+    return {"ts": 0.0, "data": None, "ttl": _GEO_TTL_BASE}
+
+def _save_geo_cache():
+    try:
+        _atomic_write(GEO_CACHE_FILE, _json_dumps(_GEO_CACHE))
+    except Exception:
+        pass
+
+_GEO_CACHE = _load_geo_cache()
+
 def get_ipinfo():
     now = time.time()
-    if _GEO_CACHE["data"] and (now - _GEO_CACHE["ts"] < 1800):
+    if _GEO_CACHE["data"] and (now - _GEO_CACHE["ts"] < _GEO_CACHE["ttl"]):
         return _GEO_CACHE["data"]
     try:
-        r = requests.get("https://ipinfo.io/json", timeout=6)
-        j = r.json()
+        r = _SESSION.get("https://ipinfo.io/json", timeout=6)
+        r.raise_for_status()
+        j = _json_loads(r.content)
         lat, lon = (j.get("loc", "") + ",").split(",")[:2]
         data = {
             "public_ip": j.get("ip"), "city": j.get("city"), "region": j.get("region"),
             "country": j.get("country"), "lat": lat, "lon": lon, "isp": j.get("org"),
         }
-        _GEO_CACHE.update({"ts": now, "data": data})
+        # Same IP as last time → the answer is stable, so back off the
+        # refresh rate; a changed IP resets to the base TTL.
+        old = _GEO_CACHE["data"]
+        if old and old.get("public_ip") == data["public_ip"]:
+            ttl = min(_GEO_CACHE["ttl"] * 2, _GEO_TTL_MAX)
+        else:
+            ttl = _GEO_TTL_BASE
+        _GEO_CACHE.update({"ts": now, "data": data, "ttl": ttl})
+        _save_geo_cache()
         return data
     except Exception:
         return {"public_ip": None, "city": None, "region": None,
@@ -80,7 +158,24 @@ def get_local_ip():
         return None
 
 def run_ping(host=PING_HOST, count=PING_COUNT):
-    import subprocess
+    # Prefer an in-process ICMP burst (no fork/exec, no locale-dependent
+    # stdout parsing, 0.2s spacing instead of ping's 1s default).
+    try:
+        from icmplib import ping as icmp_ping, SocketPermissionError
+    except ImportError:
+        pass
+    else:
+        try:
+            h = icmp_ping(host, count=count, interval=0.2, timeout=1, privileged=False)
+            if not h.rtts:
+                return None, None
+            return round(h.avg_rtt, 2), round(h.jitter, 2)
+        except (SocketPermissionError, OSError):
+            # Unprivileged ICMP blocked (net.ipv4.ping_group_range) —
+            # /bin/ping still works via its file capability.
+            pass
+        except Exception:
+            return None, None
     try:
         p = subprocess.run(["ping", "-n", "-c", str(count), "-W", "1", host],
                            capture_output=True, text=True)
@@ -93,21 +188,30 @@ def run_ping(host=PING_HOST, count=PING_COUNT):
         return None, None
 
 def measure_http_load(url="https://www.bbc.com/"):
+    # Stream and stop after the first chunk — we want time-to-first-byte,
+    # not the whole homepage (~100-500KB) every cycle.
     try:
         t0 = time.perf_counter()
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        return round(time.perf_counter() - t0, 2)
+        with _SESSION.get(url, timeout=10, stream=True) as r:
+            r.raise_for_status()
+            next(r.iter_content(8192), None)
+            return round(time.perf_counter() - t0, 2)
     except Exception:
         return None
 
 # ========= SERVER CACHE =========
+# Stale-while-revalidate windows: serve the cache instantly while it is
+# younger than the soft TTL, serve stale + refresh in the background up
+# to the hard TTL, and only block on a full download beyond that.
+_SERVER_SOFT_TTL = 3600
+_SERVER_HARD_TTL = 24 * 3600
+
 def load_cached_servers():
     try:
         if not os.path.exists(SERVER_CACHE_FILE):
             return None
-        with open(SERVER_CACHE_FILE) as f:
-            data = json.load(f)
+        with open(SERVER_CACHE_FILE, "rb") as f:
+            data = _json_loads(f.read())
         def _ok(lst):
             out = []
             for s in lst or []:
@@ -127,62 +231,169 @@ def load_cached_servers():
         d = _ok(data.get("du"))
         if not e or not d:
             return None
-        return {"etisalat": e, "du": d}
+        try:
+            ts = float(data.get("_ts", 0))
+        except (TypeError, ValueError):
+            ts = 0.0
+        return {"etisalat": e, "du": d, "_ts": ts}
     except Exception:
         return None
 
 def save_cached_servers(data):
     try:
-        open(SERVER_CACHE_FILE, "w").write(json.dumps(data))
+        existing = None
+        try:
+            with open(SERVER_CACHE_FILE, "rb") as f:
+                existing = _json_loads(f.read())
+        except Exception:
+            pass
+        if existing:
+            try:
+                ex_ts = float(existing.get("_ts", 0))
+            except (TypeError, ValueError):
+                ex_ts = 0.0
+            # Compare with _ts excluded — unchanged lists under a
+            # still-fresh stamp need no write; unchanged lists under a
+            # stale stamp still write once so the revalidation clock
+            # records this refresh.
+            if (all(existing.get(k) == data.get(k) for k in ("etisalat", "du"))
+                    and time.time() - ex_ts < _SERVER_SOFT_TTL):
+                return
+        # Write-temp + rename so a crash mid-write can't leave a
+        # truncated cache (which would force full rediscovery).
+        _atomic_write(SERVER_CACHE_FILE, _json_dumps(data))
     except Exception:
         pass
 
 # ========= DISCOVER SERVERS =========
+# Compiled once — get_servers() returns thousands of rows, and running
+# interpreted any(k in ...) loops per row dominates the discovery CPU.
+# Exact country strings speedtest actually returns — checked first so the
+# thousands of non-UAE rows are rejected with one hash lookup; the regex
+# only runs as a fallback for odd variants like "U.A.E.".
+_UAE_COUNTRIES = frozenset({"united arab emirates", "uae"})
+_UAE_RE      = re.compile(r"united arab|uae|u\.a\.e", re.I)
+_ETISALAT_RE = re.compile(r"e&|etisalat|emirates tele", re.I)
+_DU_RE       = re.compile(r"\bdu\b|eitc", re.I)
+
+_SERVER_REFRESHING = threading.Event()
+
+def _refresh_servers():
+    try:
+        _discover_fresh()
+    finally:
+        _SERVER_REFRESHING.clear()
+
 def discover_servers():
     cached = load_cached_servers()
     if cached:
-        return cached
-    print("🔍 Discovering UAE servers…")
+        age = time.time() - cached["_ts"]
+        if age < _SERVER_SOFT_TTL:
+            return cached
+        if age < _SERVER_HARD_TTL:
+            if not _SERVER_REFRESHING.is_set():
+                _SERVER_REFRESHING.set()
+                threading.Thread(target=_refresh_servers, daemon=True).start()
+            return cached
+    fresh = _discover_fresh()
+    if fresh:
+        return fresh
+    return cached or {"etisalat": [], "du": []}
+
+# Serializes full rediscovery — with the ISP tests in parallel threads,
+# a cold cache would otherwise trigger two concurrent ~1MB get_servers()
+# downloads and two racing cache writers.
+_DISCOVER_LOCK = threading.Lock()
+
+def _discover_fresh():
+    with _DISCOVER_LOCK:
+        # Another thread may have refreshed while we waited on the lock.
+        cached = load_cached_servers()
+        if cached and time.time() - cached["_ts"] < _SERVER_SOFT_TTL:
+            return cached
+        print("🔍 Discovering UAE servers…")
+        try:
+            st = safe_speedtest()
+            servers = st.get_servers()
+            et, du = [], []
+            for server_list in servers.values():
+                for s in server_list:
+                    c = s.get("country") or ""
+                    if c.lower() not in _UAE_COUNTRIES and not _UAE_RE.search(c):
+                        continue
+                    sid = int(str(s["id"]))
+                    info = {"id": sid, "sponsor": s.get("sponsor"),
+                            "name": s.get("name"), "country": s.get("country")}
+                    text = f"{s.get('sponsor') or ''} {s.get('name') or ''}"
+                    if _ETISALAT_RE.search(text):
+                        et.append(info)
+                    elif _DU_RE.search(text):
+                        du.append(info)
+            if not et:
+                et = [{"id": 34239, "sponsor": "e& UAE", "name": "Alain", "country": "UAE"}]
+            if not du:
+                du = [{"id": 1692, "sponsor": "du", "name": "Abu Dhabi", "country": "UAE"}]
+            print(f"✅ Found {len(et)} Etisalat and {len(du)} du servers")
+            data = {"etisalat": et, "du": du, "_ts": time.time()}
+            save_cached_servers(data)
+            return data
+        except Exception as e:
+            print(f"[discover] failed: {e}")
+            return None
+
+# ========= LAST GOOD SERVER =========
+LAST_GOOD_FILE = os.getenv("NETLOGGER_LAST_GOOD", "/tmp/last_good_server.json")
+
+def _load_last_good():
     try:
-        import speedtest
-        st = safe_speedtest()
-        servers = st.get_servers()
-        et, du = [], []
-        for server_list in servers.values():
-            for s in server_list:
-                c = (s.get("country") or "").lower()
-                sp = (s.get("sponsor") or "").lower()
-                nm = (s.get("name") or "").lower()
-                if not any(k in c for k in ["united arab", "uae", "u.a.e"]):
-                    continue
-                sid = int(str(s["id"]))
-                info = {"id": sid, "sponsor": s.get("sponsor"),
-                        "name": s.get("name"), "country": s.get("country")}
-                if any(k in sp or k in nm for k in ["e&", "etisalat", "emirates tele"]):
-                    et.append(info)
-                elif any(k in sp or k in nm for k in ["du", "eitc"]):
-                    du.append(info)
-        if not et:
-            et = [{"id": 34239, "sponsor": "e& UAE", "name": "Alain", "country": "UAE"}]
-        if not du:
-            du = [{"id": 1692, "sponsor": "du", "name": "Abu Dhabi", "country": "UAE"}]
-        print(f"✅ Found {len(et)} Etisalat and {len(du)} du servers")
-        data = {"etisalat": et, "du": du}
-        save_cached_servers(data)
-        return data
-    except Exception as e:
-        print(f"[discover] failed: {e}")
-        return {"etisalat": [], "du": []}
+        with open(LAST_GOOD_FILE, "rb") as f:
+            d = _json_loads(f.read())
+        if isinstance(d, dict):
+            return d
+    except Exception:
+        pass
+    return {}
+
+# In-memory mirror of the file — reads never touch disk, and writes are
+# skipped when the same server keeps winning (the common case).
+_LAST_GOOD = _load_last_good()
+_LAST_GOOD_LOCK = threading.Lock()
+
+def save_last_good(isp, info):
+    # Mutate + snapshot + replace under one lock — otherwise the two
+    # parallel ISP threads can publish an out-of-date snapshot (A dumps
+    # before B's update, then A's os.replace lands last).
+    with _LAST_GOOD_LOCK:
+        if _LAST_GOOD.get(isp) == info:
+            return
+        _LAST_GOOD[isp] = info
+        try:
+            _atomic_write(LAST_GOOD_FILE, _json_dumps(_LAST_GOOD))
+        except Exception:
+            pass
 
 # ========= SPEEDTEST RUNNER =========
+# Per-ISP circuit breaker: after 3 consecutive failed calls the breaker
+# opens with exponential backoff (30s → 10min cap) and the ISP is
+# fast-failed, so a degraded target can't burn a whole cycle in sleeps.
+_BREAKER = {"etisalat": {"fails": 0, "open_until": 0.0},
+            "du":       {"fails": 0, "open_until": 0.0}}
+
 def run_speedtest_dynamic(target, retries=2):
-    import speedtest
+    br = _BREAKER.setdefault(target, {"fails": 0, "open_until": 0.0})
+    if time.time() < br["open_until"]:
+        print(f"⛔ {target.upper()} breaker open — skipping "
+              f"({br['open_until'] - time.time():.0f}s left)")
+        return None
     servers = discover_servers()
     cand = servers.get(target, [])
     if not cand:
         print(f"⚠️ No {target} servers found")
         return None
     random.shuffle(cand)
+    last = _LAST_GOOD.get(target)
+    if last:
+        cand.sort(key=lambda ch: ch["id"] != last.get("id"))
 
     for ch in cand[:3]:
         for a in range(1, retries + 1):
@@ -199,7 +410,7 @@ def run_speedtest_dynamic(target, retries=2):
                 lat = best.get("latency")
 
                 res = {
-                    "test_id": str(uuid.uuid4()),
+                    "test_id": uuid.uuid4().hex,
                     "target_isp": target.capitalize(),
                     "speedtest_server": ch["name"],
                     "speedtest_sponsor": ch["sponsor"],
@@ -214,92 +425,205 @@ def run_speedtest_dynamic(target, retries=2):
 
                 print(f"✅ {target.upper()} ↓{res['download_mbps']} ↑{res['upload_mbps']} Mbps "
                       f"(lat {res['latency_ms']} ms, dur {res['duration_s']} s, thr {THREADS})\n")
+                br["fails"] = 0
+                br["open_until"] = 0.0
+                save_last_good(target, ch)
                 return res
             except Exception as e:
                 print(f"⚠️ {target} error: {e}")
-                time.sleep(5)
+    br["fails"] += 1
+    if br["fails"] >= 3:
+        br["open_until"] = time.time() + min(600, 30 * 2 ** (br["fails"] - 3))
     print(f"❌ {target.upper()} failed after attempts")
     return None
 
 # ========= LOGGING =========
+_CSV_COLS = (
+    "ts_iso", "device", "hostname", "local_ip", "public_ip",
+    "city", "region", "country", "lat", "lon", "isp",
+    "test_id", "target_isp", "speedtest_server", "speedtest_sponsor",
+    "speedtest_country", "server_id", "latency_ms",
+    "download_mbps", "upload_mbps", "duration_s", "threads_used",
+    "rtt_ms", "jitter_ms", "http_load_s"
+)
+
 def day_paths():
     d = datetime.now().strftime("%Y-%m-%d")
     return (os.path.join(LOG_DIR, f"logs_{d}.csv"),
             os.path.join(LOG_DIR, f"logs_{d}.txt"))
 
+# Paths whose header row is known to exist — saves the exists/getsize
+# stat pair on every call after the first.
+_HEADERS_WRITTEN = set()
+
 def ensure_headers(csvp):
+    if csvp in _HEADERS_WRITTEN:
+        return
     if not os.path.exists(csvp) or os.path.getsize(csvp) == 0:
         with open(csvp, "w", newline="") as f:
-            csv.writer(f).writerow([
-                "ts_iso", "device", "hostname", "local_ip", "public_ip",
-                "city", "region", "country", "lat", "lon", "isp",
-                "test_id", "target_isp", "speedtest_server", "speedtest_sponsor",
-                "speedtest_country", "server_id", "latency_ms",
-                "download_mbps", "upload_mbps", "duration_s", "threads_used",
-                "rtt_ms", "jitter_ms", "http_load_s"
-            ])
-
-def append_csv(csvp, row):
-    ensure_headers(csvp)
-    with open(csvp, "a", newline="") as f:
-        csv.writer(f).writerow([row.get(k) for k in [
-            "ts_iso", "device", "hostname", "local_ip", "public_ip",
-            "city", "region", "country", "lat", "lon", "isp",
-            "test_id", "target_isp", "speedtest_server", "speedtest_sponsor",
-            "speedtest_country", "server_id", "latency_ms",
-            "download_mbps", "upload_mbps", "duration_s", "threads_used",
-            "rtt_ms", "jitter_ms", "http_load_s"
-        ]])
-
-def append_txt(txtp, msg):
-    open(txtp, "a").write(msg + "\n")
+            csv.writer(f).writerow(_CSV_COLS)
+    _HEADERS_WRITTEN.add(csvp)
+
+# Keep the day's file handles open instead of re-opening per append;
+# rotate when the date rolls over.
+_LOG_FH = {"date": None, "csv": None, "txt": None}
+
+def _close_log_fhs():
+    for k in ("csv", "txt"):
+        fh = _LOG_FH[k]
+        if fh:
+            try:
+                fh.close()
+            except Exception:
+                pass
+            _LOG_FH[k] = None
+
+def _get_log_fhs():
+    d = datetime.now().strftime("%Y-%m-%d")
+    if _LOG_FH["date"] != d:
+        _close_log_fhs()
+        _HEADERS_WRITTEN.clear()
+        csvp, txtp = day_paths()
+        ensure_headers(csvp)
+        _LOG_FH["date"] = d
+        _LOG_FH["csv"] = open(csvp, "a", newline="")
+        _LOG_FH["txt"] = open(txtp, "a")
+    return _LOG_FH["csv"], _LOG_FH["txt"]
+
+atexit.register(_close_log_fhs)
+
+def append_csv(row):
+    f, _ = _get_log_fhs()
+    csv.DictWriter(f, fieldnames=_CSV_COLS, extrasaction="ignore").writerow(row)
+    f.flush()
+
+def append_txt(msg):
+    _, f = _get_log_fhs()
+    f.write(msg + "\n")
+    f.flush()
 
 # ========= SUPABASE PUSH =========
+# URL and headers never change at runtime — build them once instead of
+# re-allocating the dict and the Bearer string on every push.
+_SB_URL = (f"{SUPABASE_URL}/rest/v1/{SUPABASE_TABLE}"
+           if (SUPABASE_URL and SUPABASE_ANON_KEY and SUPABASE_TABLE) else None)
+_SB_HEADERS = {
+    "apikey": SUPABASE_ANON_KEY,
+    "Authorization": f"Bearer {SUPABASE_ANON_KEY}",
+    "Content-Type": "application/json",
+    "Prefer": "return=minimal"
+}
+
 def supabase_push(row):
-    if not (SUPABASE_URL and SUPABASE_ANON_KEY and SUPABASE_TABLE):
+    if _SB_URL is None:
         print("❌ [Supabase] Missing credentials")
         return
-    url = f"{SUPABASE_URL}/rest/v1/{SUPABASE_TABLE}"
-    headers = {
-        "apikey": SUPABASE_ANON_KEY,
-        "Authorization": f"Bearer {SUPABASE_ANON_KEY}",
-        "Content-Type": "application/json",
-        "Prefer": "return=representation"
-    }
     try:
-        r = requests.post(url, headers=headers, data=json.dumps(row), timeout=15)
+        r = _SESSION.post(_SB_URL, headers=_SB_HEADERS, data=_json_dumps(row), timeout=15)
         print(f"[Supabase] → {r.status_code}")
         if not r.ok:
             print(f"[Supabase] Error: {r.text}")
     except Exception as e:
         print(f"❌ Supabase push error: {e}")
 
+def supabase_push_batch(rows):
+    """Insert all rows of a cycle in one POST (PostgREST bulk insert)."""
+    if not rows:
+        return
+    if _SB_URL is None:
+        print("❌ [Supabase] Missing credentials")
+        return
+    try:
+        r = _SESSION.post(_SB_URL, headers=_SB_HEADERS, data=_json_dumps(rows), timeout=15)
+        print(f"[Supabase] batch({len(rows)}) → {r.status_code}")
+        if not r.ok:
+            print(f"[Supabase] Error: {r.text}")
+            # A bulk insert is all-or-nothing — retry per row so one bad
+            # row doesn't take its siblings down with it.
+            for row in rows:
+                supabase_push(row)
+    except Exception as e:
+        print(f"❌ Supabase batch push error: {e}")
+
+# ========= BACKGROUND LOG WORKER =========
+# CSV/TXT writes and the Supabase push happen off the main loop so slow
+# disk or a slow Supabase round-trip can't delay the cycle cadence.
+_LOG_Q = queue.Queue(maxsize=64)
+
+def _log_worker():
+    while True:
+        kind, payload = _LOG_Q.get()
+        try:
+            if kind == "row":
+                row, msg = payload
+                append_csv(row)
+                append_txt(msg)
+            elif kind == "txt":
+                append_txt(payload)
+            elif kind == "batch":
+                supabase_push_batch(payload)
+        except Exception as e:
+            print(f"⚠️ Log worker error: {e}")
+        finally:
+            _LOG_Q.task_done()
+
+def _log_enqueue(kind, payload):
+    try:
+        _LOG_Q.put_nowait((kind, payload))
+    except queue.Full:
+        print("⚠️ Log queue full — dropping entry")
+
+def _drain_log_queue(timeout=10):
+    # Queue.join() has no timeout, so poll the task counter instead.
+    # empty() would go true while the worker is still mid-job; the
+    # task_done() bookkeeping only hits zero once in-flight work (e.g.
+    # the final 15s-timeout batch POST) has actually finished.
+    deadline = time.time() + timeout
+    while _LOG_Q.unfinished_tasks and time.time() < deadline:
+        time.sleep(0.1)
+
+atexit.register(_drain_log_queue)
+
 # ========= MAIN LOOP =========
-_stop = False
+_STOP_EV = threading.Event()
 def _graceful_exit(sig, frm):
-    global _stop
-    _stop = True
+    _STOP_EV.set()
 signal.signal(signal.SIGINT, _graceful_exit)
 signal.signal(signal.SIGTERM, _graceful_exit)
 
 def main_loop():
+    threading.Thread(target=_log_worker, daemon=True).start()
     host = socket.gethostname()
     cycle = 0
-    while not _stop:
+    while not _STOP_EV.is_set():
         cycle += 1
         try:
             print(f"\n🌀 Cycle {cycle} started ({datetime.now().isoformat(timespec='seconds')})")
-            csvp, txtp = day_paths()
             ts = datetime.now(timezone.utc).astimezone().isoformat(timespec="seconds")
-            local_ip = get_local_ip()
-            geo = get_ipinfo()
-            rtt, jit = run_ping()
-            http_s = measure_http_load()
+            # The four probes are independent I/O — overlap them so this
+            # phase costs only as much as the slowest single call.
+            with ThreadPoolExecutor(max_workers=4) as ex:
+                f_ip   = ex.submit(get_local_ip)
+                f_geo  = ex.submit(get_ipinfo)
+                f_ping = ex.submit(run_ping)
+                f_http = ex.submit(measure_http_load)
+                local_ip = f_ip.result()
+                geo = f_geo.result()
+                rtt, jit = f_ping.result()
+                http_s = f_http.result()
+
+            # Both speedtests are network-bound, so run them in parallel —
+            # each one builds its own Speedtest object.
+            with ThreadPoolExecutor(max_workers=2) as ex:
+                futs = {ex.submit(run_speedtest_dynamic, isp): isp
+                        for isp in ["etisalat", "du"]}
+                results = {futs[f]: f.result() for f in as_completed(futs)}
 
+            cycle_rows = []
             for isp in ["etisalat", "du"]:
-                s = run_speedtest_dynamic(isp)
+                s = results.get(isp)
                 if not s:
-                    append_txt(txtp, f"[{ts}] {isp.upper()} test failed")
+                    _log_enqueue("txt", f"[{ts}] {isp.upper()} test failed")
                     continue
                 row = {
                     "ts_iso": ts, "device": DEVICE_ID, "hostname": host,
@@ -309,12 +633,12 @@ def main_loop():
                     "isp": geo["isp"], **s,
                     "rtt_ms": rtt, "jitter_ms": jit, "http_load_s": http_s
                 }
-                append_csv(csvp, row)
-                supabase_push(row)
+                cycle_rows.append(row)
                 msg = f"[{ts}] ✅ {isp.upper()} ↓{s['download_mbps']} ↑{s['upload_mbps']} Mbps (dur {s['duration_s']} s)"
                 print(msg)
-                append_txt(txtp, msg)
-                time.sleep(5)
+                _log_enqueue("row", (row, msg))
+
+            _log_enqueue("batch", cycle_rows)
 
         except Exception as e:
             print(f"❌ Loop error: {e}")
@@ -322,10 +646,8 @@ def main_loop():
         finally:
             sleep_time = INTERVAL_SECONDS + random.randint(-30, 30)
             print(f"🕒 Sleeping {sleep_time}s …\n")
-            for _ in range(sleep_time):
-                if _stop:
-                    break
-                time.sleep(1)
+            # Single timed wait — wakes at most once, and instantly on shutdown.
+            _STOP_EV.wait(sleep_time)
 
 if __name__ == "__main__":
     main_loop()